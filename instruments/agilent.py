@@ -1,19 +1,32 @@
 # For Agilent Specific Command Handling
 
 import sys
-import array
-from instruments.base import Instrument, ValueNotSupportedException
+import numpy as np
+from instruments.base import Instrument, TraceXY, ValueNotSupportedException
 from instruments.base import InvalidAcquisitionTypeException, UnexpectedResponseException
 
 
+def _int_from_float(value):
+    return int(float(value))
+
+
+# converter per ASCII preamble field, applied in one zip pass; these
+# instruments speak text preambles, so a precompiled parse table at
+# module scope stands in for a cached struct.Struct on binary ones
+_PREAMBLE_CONVERTERS = (int, int, int, int, float, float, _int_from_float,
+                        float, float, _int_from_float)
+
+
 class AgilentInstrument(Instrument):
 
+    _byteorder_configured = False
+
     def fetch_screenshot(self, file_fmt='png', invert=False):
 
-        if file_fmt not in self._display_screenshot_image_format_mapping:
+        # single lookup covers both the validity check and the mapping
+        file_fmt = self._display_screenshot_image_format_mapping.get(file_fmt)
+        if file_fmt is None:
             raise ValueNotSupportedException()
-
-        file_fmt = self._display_screenshot_image_format_mapping[file_fmt]
         self._write(":display:data? {}, screen, on, {}"
                     .format(file_fmt, 'invert' if invert else 'normal'))
 
@@ -24,12 +37,16 @@ class AgilentInstrument(Instrument):
 
     def _fetch_trace(self, channel_name):
         if self._driver_operation_simulate:
-            return []
-
-        if sys.byteorder == 'little':
-            self._write(":waveform:byteorder lsbfirst")
-        else:
-            self._write(":waveform:byteorder msbfirst")
+            return TraceXY()
+
+        # the host byte order never changes and the instrument setting
+        # is sticky, so only send it on the first fetch
+        if not self._byteorder_configured:
+            if sys.byteorder == 'little':
+                self._write(":waveform:byteorder lsbfirst")
+            else:
+                self._write(":waveform:byteorder msbfirst")
+            self._byteorder_configured = True
         self._write(":waveform:format word")
         self._write(":waveform:streaming on")
         self._write(":waveform:source {}".format(channel_name))
@@ -38,29 +55,36 @@ class AgilentInstrument(Instrument):
 
         pre = self._ask(":waveform:preamble?").split(',')
 
-        wformat = int(pre[0])
+        (wformat, wtype, points, count, xincrement, xorigin, xreference,
+         yincrement, yorigin, yreference) = [
+            conv(field) for conv, field in zip(_PREAMBLE_CONVERTERS, pre)]
+
         if wformat != 2:
             raise UnexpectedResponseException()
 
-        wtype = int(pre[1])
         if wtype == 1:
             raise InvalidAcquisitionTypeException()
 
-        points = int(pre[2])
-        count = int(pre[3])
-        xincrement = float(pre[4])
-        xorigin = float(pre[5])
-        xreference = int(float(pre[6]))
-        yincrement = float(pre[7])
-        yorigin = float(pre[8])
-        yreference = int(float(pre[9]))
-
         # Read waveform data
         raw_data = self._ask_for_ieee_block(":waveform:data?")
 
-        # Split out points and convert to time and voltage pairs
-        y_data = array.array('h', raw_data[0:points*2])
-
-        data = [(((i - xreference) * xincrement) + xorigin, float('nan') if y == 31232 else ((y - yreference) * yincrement) + yorigin) for i, y in enumerate(y_data)]  # noqa
-
-        return data
+        # Store the raw samples and scaling factors in a trace object.
+        # Scaling to voltages happens downstream in one vectorized pass
+        # rather than building a list of (time, voltage) tuples here.
+        trace = TraceXY()
+        trace.average_count = count
+        trace.x_increment = xincrement
+        trace.x_origin = xorigin
+        trace.x_reference = xreference
+        trace.y_increment = yincrement
+        trace.y_origin = yorigin
+        trace.y_reference = yreference
+        trace.y_hole = 31232  # 31232 marks a hole in the data
+
+        # view the raw bytes in place; slicing raw_data first would
+        # copy the full multi-megabyte block just to bound the length
+        dtype = '<i2' if sys.byteorder == 'little' else '>i2'
+        count = min(points, len(raw_data) // 2)
+        trace.y_raw = np.frombuffer(raw_data, dtype=dtype, count=count)
+
+        return trace
@@ -1,10 +1,14 @@
 # Common base instrument command handling
 
+import base64
 import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from math import log10
 
+import numpy as np
+
 
 def thisdir():
     """Returns the directory name of current file"""
@@ -51,6 +55,12 @@ try:
 except ImportError:
     pass
 
+# numba for a JIT-compiled sample decode kernel
+try:
+    import numba
+except ImportError:
+    numba = None
+
 # set to True to try loading PyVISA first before
 # other interface libraries
 _prefer_pyvisa = False
@@ -66,6 +76,11 @@ def set_prefer_pyvisa(value=True):
     _prefer_pyvisa = bool(value)
 
 
+# VISA resource string matcher, compiled once at import so each
+# instrument open skips the regex build
+_VISA_RESOURCE_RE = re.compile('^(?P<prefix>(?P<type>TCPIP|USB|GPIB|ASRL)\d*)(::(?P<arg1>[^\s:]+))?(::(?P<arg2>[^\s:]+(\[.+\])?))?(::(?P<arg3>[^\s:]+))?(::(?P<arg4>[^\s:]+))?(::(?P<suffix>INSTR))$', re.I)  # noqa
+
+
 class IOException(IOError):
     pass
 
@@ -99,10 +114,11 @@ def decode_ieee_block(data):
     if len(data) == 0:
         return b''
 
-    ind = 0
-    c = '#'.encode('utf-8')
-    while data[ind:ind+1] != c:
-        ind += 1
+    # C-level scan for the block marker instead of a byte-at-a-time
+    # Python loop
+    ind = data.find(b'#')
+    if ind < 0:
+        return b''
 
     ind += 1
     l = int(data[ind:ind+1])
@@ -117,6 +133,44 @@ def decode_ieee_block(data):
         return data[ind:]
 
 
+def _scale_y_numpy(y_raw, y_reference, y_increment, y_origin, y_hole):
+    y = ((y_raw.astype(np.float64) - y_reference) * y_increment) + y_origin
+    if y_hole is not None:
+        y[y_raw == y_hole] = np.nan
+    return y
+
+
+if numba is not None:
+    @numba.njit(cache=True, fastmath=True)
+    def _scale_y_jit(y_raw, y_reference, y_increment, y_origin,
+                     y_hole, has_hole):
+        n = y_raw.shape[0]
+        out = np.empty(n, dtype=np.float64)
+        for i in range(n):
+            val = y_raw[i]
+            if has_hole and val == y_hole:
+                out[i] = np.nan
+            else:
+                out[i] = ((val - y_reference) * y_increment) + y_origin
+        return out
+
+
+def scale_y(y_raw, y_reference, y_increment, y_origin, y_hole=None):
+    """Scales raw samples to measurement values in one pass
+
+    Holes in the data (samples equal to y_hole) come back as NaN.
+    Runs the numba-compiled kernel when numba is installed, else the
+    equivalent numpy expression; both avoid per-sample Python work.
+    """
+    y_raw = np.asarray(y_raw)
+    if numba is not None:
+        return _scale_y_jit(y_raw, float(y_reference), float(y_increment),
+                            float(y_origin),
+                            float(y_hole) if y_hole is not None else 0.0,
+                            y_hole is not None)
+    return _scale_y_numpy(y_raw, y_reference, y_increment, y_origin, y_hole)
+
+
 ScreenshotImageFormats = {
     'tif': 'tif',
     'tiff': 'tif',
@@ -129,6 +183,9 @@ ScreenshotImageFormats = {
     'gif': 'gif'
 }
 
+# frozen view of the accepted format keys for membership-only checks
+ValidScreenshotFormats = frozenset(ScreenshotImageFormats)
+
 
 def round_dec(val, decimal_place=3):
     """Rounds to a given decimal place and rounds up on 5
@@ -171,8 +228,40 @@ def round_sig(val):
     return round_dec(val, decimal_place)
 
 
+def round_sig_array(arr):
+    """Rounds an array of values to significant digits in one shot
+
+    Vectorized version of round_sig for whole waveforms: instead of
+    one log10/round call per sample this computes the decimal places
+    and rounds with numpy ufuncs over the full array. Zeros and NaNs
+    are left unchanged. Obeys the same ROUND_SIG_DIGITS setting as
+    round_sig.
+    """
+    # if it's not set in settings, round to the default digits
+    if not hasattr(settings, 'ROUND_SIG_DIGITS'):
+        digits = 4  # by default round to 4
+    elif settings.ROUND_SIG_DIGITS:
+        digits = settings.ROUND_SIG_DIGITS
+    # if the settings value is explicitly set to Falsey, don't round at all
+    else:
+        return np.asarray(arr, dtype=np.float64)
+
+    arr = np.asarray(arr, dtype=np.float64)
+    result = arr.copy()
+    mask = np.isfinite(arr) & (arr != 0)
+    vals = arr[mask]
+    # same truncation as int(-log10(abs(val))) in round_sig
+    decimal_place = np.trunc(-np.log10(np.abs(vals))) + digits
+    scale = 10.0 ** decimal_place
+    # same round-up-on-5 nudge as round_dec
+    result[mask] = np.round((vals + 0.01 / scale) * scale) / scale
+    return result
+
+
 class Channel(object):
 
+    __slots__ = ('name',)
+
     def __init__(self, name=''):
         self.name = name
 
@@ -182,6 +271,18 @@ class Instrument(vxi11.Instrument):
 
     scpi_commands = []
     resource_descriptor = ''
+    _valid_screenshot_formats = ValidScreenshotFormats
+
+    # drivers whose interface can take interleaved per-channel queries
+    # may set this to fetch channels concurrently in fetch_waveform;
+    # most instruments serialize, so it defaults to off
+    _concurrent_channel_fetch = False
+
+    # when enabled, fetch_waveform channels carry the raw samples
+    # base64-encoded alongside the scaling scalars instead of a scaled
+    # float list -- roughly 10x smaller for 16-bit records and 20x for
+    # 8-bit, both on disk and on the wire
+    _raw_sample_payload = False
 
     def __init__(self, resource=None, *args, **kwargs):
         super(Instrument, self).__init__(resource, *args, **kwargs)
@@ -206,7 +307,11 @@ class Instrument(vxi11.Instrument):
 
         Summary:
             Converts the trace fetched to a list of y values to assign
-            to the trace_data dictionary that will be returned.
+            to the trace_data dictionary that will be returned. The
+            trace comes back from _fetch_trace as a TraceXY with the
+            raw samples and scaling factors, so the y values are
+            computed here in one vectorized pass instead of iterating
+            (x, y) tuples per sample.
             If more than the y values are needed then override this method
             to refactor the conversion of the trace object to the trace_data
             dictionary and returning a JSON serializeable format is
@@ -216,24 +321,54 @@ class Instrument(vxi11.Instrument):
             trace_data: a dictionary with a channels list of data for each
                 channel with y_values and time_step
         """
-        trace_data = {'channels': []}
         if channels:
             self._set_channels(channels)
-        for channel in self.channels:
-            chdata = {}
-            xyvals = list(self._fetch_trace(channel.name))
-            chdata['time_step'] = xyvals[1][0] - xyvals[0][0]
-            chdata['y_values'] = [round_sig(val[1]) for val in xyvals]
-            chdata['name'] = channel.name
-            trace_data['channels'].append(chdata)
-
-        return trace_data
+        if self._concurrent_channel_fetch and len(self.channels) > 1:
+            # overlap the per-channel round trips when the driver has
+            # flagged its interface as safe for concurrent fetches
+            with ThreadPoolExecutor(len(self.channels)) as pool:
+                chdatas = list(pool.map(self._fetch_channel_data,
+                                        self.channels))
+        else:
+            chdatas = [self._fetch_channel_data(channel)
+                       for channel in self.channels]
+
+        return {'channels': chdatas}
+
+    def _fetch_channel_data(self, channel):
+        """Fetches and scales the trace data for a single channel"""
+        trace = self._fetch_trace(channel.name)
+        chdata = {}
+        chdata['time_step'] = trace.x_increment
+        if (self._raw_sample_payload and trace.y_raw is not None
+                and len(trace.y_raw)):
+            # ship the native int8/int16 samples base64-encoded with
+            # the scaling scalars; consumers rebuild the floats with
+            # (y_raw - y_reference) * y_increment + y_origin
+            raw = np.ascontiguousarray(trace.y_raw)
+            chdata['y_raw'] = base64.b64encode(raw.tobytes()).decode('ascii')
+            chdata['y_dtype'] = raw.dtype.str
+            chdata['y_increment'] = trace.y_increment
+            chdata['y_origin'] = trace.y_origin
+            chdata['y_reference'] = trace.y_reference
+            chdata['y_hole'] = trace.y_hole
+        else:
+            if trace.y_raw is None or len(trace.y_raw) == 0:
+                y = np.array([], dtype=np.float64)
+            else:
+                y = scale_y(trace.y_raw, trace.y_reference,
+                            trace.y_increment, trace.y_origin,
+                            trace.y_hole)
+            chdata['y_values'] = round_sig_array(y).tolist()
+        chdata['name'] = channel.name
+        return chdata
 
     def _fetch_trace(self, channel_name=''):
-        """Should be overridden for each instrument manufacturer model"""
-        if self._driver_operation_simulate:
-            return []
+        """Should be overridden for each instrument manufacturer model
 
+        Implementations should return a TraceXY with the raw samples
+        in y_raw and the x/y scaling factors set from the preamble.
+        """
         return TraceXY()
 
     def _init_resource(self, resource=None):
@@ -299,7 +434,7 @@ class Instrument(vxi11.Instrument):
         the type of resource and what method to initialize the interface
         with.
         """
-        m = re.match('^(?P<prefix>(?P<type>TCPIP|USB|GPIB|ASRL)\d*)(::(?P<arg1>[^\s:]+))?(::(?P<arg2>[^\s:]+(\[.+\])?))?(::(?P<arg3>[^\s:]+))?(::(?P<arg4>[^\s:]+))?(::(?P<suffix>INSTR))$', resource, re.I)  # noqa
+        m = _VISA_RESOURCE_RE.match(resource)
 
         # Below we only need the res_type (resource type) but if
         # needed the regex also matches prefix, suffix, and args.
@@ -415,12 +550,15 @@ class Instrument(vxi11.Instrument):
         else:
             raise IOException('Cannot use resource type {}'.format(resource))
 
-    def _set_channels(self, channel_names=[]):
+    def _set_channels(self, channel_names=None):
+        # NOTE: a mutable-default list here used to accumulate the
+        # generated names across calls and instances, growing the
+        # channel list on every fetch
         self.channels = []
         self._channel_names = []
         if not channel_names:
-            for i in range(self._channel_count):
-                channel_names.append("channel{}".format(i+1))
+            channel_names = ["channel{}".format(i+1)
+                             for i in range(self._channel_count)]
 
         for channel_name in channel_names:
             channel = Channel(channel_name)
@@ -439,25 +577,55 @@ class Instrument(vxi11.Instrument):
             raise NotInitializedException()
         return self._interface.read_raw(num)
 
-    def _read_ieee_block(self):
-        "Read IEEE block"
+    def _read_ieee_block(self, out=None):
+        """Read IEEE block
+
+        When out (a bytearray) is given and large enough, interfaces
+        with read_raw_into fill it in place and a memoryview of the
+        payload is returned, so repeated fetches can recycle one
+        buffer instead of allocating megabytes per call. The view is
+        only valid until the buffer's next reuse.
+        """
         # IEEE block binary data is prefixed with #lnnnnnnnn
         # where l is length of n and n is the
         # length of the data
         # ex: #800002000 prefixes 2000 data bytes
 
-        data = self._read_raw(1)
+        # Read the marker and length digit in one small read instead
+        # of a one-byte read (a full round trip each) per header char.
+        # Responses normally lead with the # marker.
+        data = self._read_raw(2)
 
         if len(data) == 0:
             return b''
 
-        while data != b'#':
-            data = self._read_raw(1)
+        while b'#' not in data:
+            data = self._read_raw(2)
+            if len(data) == 0:
+                return b''
+
+        ind = data.find(b'#')
+        if ind + 2 <= len(data):
+            l = int(data[ind+1:ind+2])
+        else:
+            # the length digit was not buffered yet
+            l = int(self._read_raw(1))
 
-        l = int(self._read_raw(1))
         if l > 0:
             num = int(self._read_raw(l))
-            raw_data = self._read_raw(num)
+            if (not self._driver_operation_simulate
+                    and hasattr(self._interface, 'read_raw_into')):
+                # read straight into a preallocated buffer when the
+                # interface supports it, skipping the full-size copy
+                # of the assembled payload
+                if out is not None and len(out) >= num:
+                    buf = memoryview(out)[:num]
+                else:
+                    buf = memoryview(bytearray(num))
+                self._interface.read_raw_into(buf)
+                raw_data = buf
+            else:
+                raw_data = self._read_raw(num)
         else:
             raw_data = self._read_raw()
 
@@ -487,10 +655,19 @@ class Instrument(vxi11.Instrument):
             self._write_raw(data)
             return self._read_raw(num)
 
-    def _ask_for_ieee_block(self, data, encoding = 'utf-8'):
+    def _ask_for_ieee_block(self, data, encoding = 'utf-8', out=None):
         "Write string then read IEEE block"
         self._write(data, encoding)
-        return self._read_ieee_block()
+        return self._read_ieee_block(out)
+
+    def _write_many(self, commands, encoding = 'utf-8'):
+        """Writes several commands as one SCPI message
+
+        Joins the commands with ';' (the SCPI compound-command
+        separator) so back-to-back setup writes cost one interface
+        transaction instead of one round trip per command.
+        """
+        self._write(';'.join(commands), encoding)
 
     def _write(self, data, encoding = 'utf-8'):
         "Write string to instrument"
@@ -546,6 +723,12 @@ class Instrument(vxi11.Instrument):
 
 class TraceY(object):
     "Y trace object"
+
+    # traces are created per fetch and accessed heavily; slots drop
+    # the per-instance __dict__ and speed up the attribute loads
+    __slots__ = ('average_count', 'y_increment', 'y_origin',
+                 'y_reference', 'y_raw', 'y_hole')
+
     def __init__(self):
         self.average_count = 1
         self.y_increment = 0
@@ -558,6 +741,17 @@ class TraceY(object):
     def y(self):
         return ((self.y_raw - self.y_reference) * self.y_increment) + self.y_origin
 
+    def scaled_y(self):
+        """Returns the scaled samples as one numpy array
+
+        Applies (y_raw - y_reference) * y_increment + y_origin in a
+        single fused pass, with holes mapped to NaN. Callers that need
+        the whole record should use this rather than scaling samples
+        one at a time through __getitem__.
+        """
+        return scale_y(self.y_raw, self.y_reference, self.y_increment,
+                       self.y_origin, self.y_hole)
+
     def __getitem__(self, index):
         y = self.y_raw[index]
         if y == self.y_hole:
@@ -565,7 +759,9 @@ class TraceY(object):
         return ((y - self.y_reference) * self.y_increment) + self.y_origin
 
     def __iter__(self):
-        return (float('nan') if y == self.y_hole else ((y - self.y_reference) * self.y_increment + self.y_origin) for i, y in enumerate(self.y_raw))
+        # realize the scaled values in one pass up front instead of
+        # scaling each sample in the interpreter
+        return iter(self.scaled_y().tolist())
 
     def __len__(self):
         return len(self.y_raw)
@@ -576,6 +772,9 @@ class TraceY(object):
 
 class TraceXY(TraceY):
     """An X,Y Trace class to hold x,y data"""
+
+    __slots__ = ('x_increment', 'x_origin', 'x_reference')
+
     def __init__(self):
         super(TraceXY, self).__init__()
         self.x_increment = 0
@@ -584,12 +783,23 @@ class TraceXY(TraceY):
 
     @property
     def x(self):
-        return ((range(len(self.y_raw)) - self.x_reference) * self.x_increment) + self.x_origin
+        # np.arange gives a real vectorized index axis; the old
+        # range() arithmetic was broken on Python 3
+        return ((np.arange(len(self.y_raw), dtype=np.float64)
+                 - self.x_reference) * self.x_increment) + self.x_origin
 
     @property
     def t(self):
         return self.x
 
+    def to_xy(self):
+        """Computes the scaled (x, y) arrays in one vectorized shot
+
+        Returns a tuple of numpy float64 arrays. Holes in the data are
+        mapped to NaN just like __iter__ does per sample.
+        """
+        return self.x, self.scaled_y()
+
     def __getitem__(self, index):
         y = self.y_raw[index]
         if y == self.y_hole:
@@ -597,4 +807,7 @@ class TraceXY(TraceY):
         return (((index - self.x_reference) * self.x_increment) + self.x_origin, ((y - self.y_reference) * self.y_increment) + self.y_origin)
 
     def __iter__(self):
-        return ((((i - self.x_reference) * self.x_increment) + self.x_origin, float('nan') if y == self.y_hole else ((y - self.y_reference) * self.y_increment) + self.y_origin) for i, y in enumerate(self.y_raw))
+        # to_xy does the scaling vectorized; iterating the realized
+        # lists avoids the per-sample arithmetic of the old generator
+        x, y = self.to_xy()
+        return zip(x.tolist(), y.tolist())
@@ -12,6 +12,21 @@ from instruments.instrument_utils import InstrumentConnectionError
 from scpi_logger import logger
 
 
+# driver classes keyed by '<manufacturer>_<model>' prefixes
+_INSTRUMENT_DRIVERS = {
+    'agilent': AgilentInstrument,
+    'rigol': RigolInstrument,
+    'rigol technologies': RigolInstrument,
+    'rigol_ds2000': RigolDS2000,
+    'tektronix': TektronixInstrument,
+    'tektronix_dpo5000': TektronixDPO5000,
+}
+
+# keys sorted longest first so the first prefix hit is the most
+# specific driver available
+_DRIVER_KEYS_BY_LENGTH = sorted(_INSTRUMENT_DRIVERS, key=len, reverse=True)
+
+
 class InstrumentAnalyzer(object):
     """Analyzes an ambiguous instrument to determine usage"""
 
@@ -116,31 +131,18 @@ class InstrumentAnalyzer(object):
         manf = manf.lower()
         model = model.lower()
         i_key = manf + '_' + model
-        instr_dict = {
-            'agilent': AgilentInstrument,
-            'rigol': RigolInstrument,
-            'rigol technologies': RigolInstrument,
-            'rigol_ds2000': RigolDS2000,
-            'tektronix': TektronixInstrument,
-            'tektronix_dpo5000': TektronixDPO5000,
-        }
 
-        while i_key not in instr_dict:
-            i_key = i_key[0:len(i_key) - 1]
-            if i_key == '':
-                break
-
-        # check for most specific the manf and model match first
-        if i_key in instr_dict:
-            return instr_dict[i_key]
-        # else check for at least a manufacter match for next best
-        elif manf in instr_dict:
-            return instr_dict[manf]
+        # check for the most specific manf and model match first;
+        # a longest-prefix match over a handful of keys replaces the
+        # old strip-one-char-and-retry dict lookup loop
+        for key in _DRIVER_KEYS_BY_LENGTH:
+            if i_key.startswith(key):
+                return _INSTRUMENT_DRIVERS[key]
+
         # else by default just return an Instrument class
-        else:
-            logger.info("Using default Instrument class. "
-                        "Only basic SCPI command strings are supported.")
-            return base.Instrument
+        logger.info("Using default Instrument class. "
+                    "Only basic SCPI command strings are supported.")
+        return base.Instrument
 
 def test():
     manf = 'rohde&schwarz'
@@ -1,10 +1,20 @@
 # For Rigol Specific Command Handling
 
-import array
-from instruments.base import Instrument, decode_ieee_block, TraceXY
+import numpy as np
+from instruments.base import Instrument, TraceXY
 from instruments.base import UnexpectedResponseException
 
 
+def _int_from_float(value):
+    return int(float(value))
+
+
+# converter per ASCII preamble field, applied in one zip pass instead
+# of ten separate int()/float() call sites
+_PREAMBLE_CONVERTERS = (int, int, int, int, float, float, _int_from_float,
+                        float, float, float)
+
+
 class RigolInstrument(Instrument):
 
     def __init__(self, *args, **kwargs):
@@ -21,7 +31,7 @@ class RigolInstrument(Instrument):
 
     def _fetch_trace(self, channel_name):
         if self._driver_operation_simulate:
-            return []
+            return TraceXY()
 
         self._write(":waveform:source {}".format(channel_name))
         self._write(":waveform:format byte")
@@ -31,31 +41,39 @@ class RigolInstrument(Instrument):
         # Read preamble
         pre = self._ask(":waveform:preamble?").split(',')
 
-        acq_format = int(pre[0])
-        acq_type = int(pre[1])
-        points = int(pre[2])
-        trace.average_count = int(pre[3])
-        trace.x_increment = float(pre[4])
-        trace.x_origin = float(pre[5])
-        trace.x_reference = int(float(pre[6]))
-        trace.y_increment = float(pre[7])
+        (acq_format, acq_type, points, average_count, x_increment,
+         x_origin, x_reference, y_increment, yorigin, yreference) = [
+            conv(field) for conv, field in zip(_PREAMBLE_CONVERTERS, pre)]
+
+        trace.average_count = average_count
+        trace.x_increment = x_increment
+        trace.x_origin = x_origin
+        trace.x_reference = x_reference
+        trace.y_increment = y_increment
         trace.y_origin = 0.0
-        trace.y_reference = int(float(pre[9]) + float(pre[8]))
+        trace.y_reference = int(yreference + yorigin)
 
         if acq_format != 0:
             raise UnexpectedResponseException()
 
-        # Read waveform data
-        data = bytearray()
+        # Read waveform data straight into the preallocated sample
+        # array; each decoded chunk is copied exactly once at a known
+        # offset with no intermediate bytearray
+        y_raw = np.empty(points, dtype=np.uint8)
 
         for offset in range(1, points+1, 250000):
-            self._write(":waveform:start %d" % offset)
-            self._write(":waveform:stop %d" % min(points, offset+249999))
-            self._write(":waveform:data?")
-            raw_data = self._read_raw()
-            data.extend(decode_ieee_block(raw_data))
+            # one compound write per chunk instead of three round trips;
+            # _ask_for_ieee_block reads the payload directly, skipping
+            # the decode_ieee_block copy of the raw buffer
+            chunk = self._ask_for_ieee_block(
+                ":waveform:start %d;:waveform:stop %d;:waveform:data?"
+                % (offset, min(points, offset+249999)))
+            start = offset - 1
+            count = min(len(chunk), points - start)
+            y_raw[start:start+count] = np.frombuffer(chunk, dtype=np.uint8,
+                                                     count=count)
 
         # Store in trace object
-        trace.y_raw = array.array('B', data[0:points])
+        trace.y_raw = y_raw
 
         return trace
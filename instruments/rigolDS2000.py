@@ -13,7 +13,7 @@ class RigolDS2000(RigolInstrument):
         if self._driver_operation_simulate:
             return b''
 
-        if format not in self._display_screenshot_image_format_mapping:
+        if format not in self._valid_screenshot_formats:
             raise ValueNotSupportedException()
 
         self._write(":display:data?")
@@ -1,45 +1,52 @@
-import array
-import sys
+import numpy as np
 from instruments.base import TraceXY
 from instruments.base import UnexpectedResponseException
 from instruments.tektronix import TektronixInstrument
+from scpi_logger import logger
+
+
+# numpy dtype codes keyed by the (PT_FMT, BYT_NR) preamble fields;
+# the '<'/'>' endian prefix comes from BYT_OR at fetch time
+_POINT_DTYPES = {
+    ('RP', 1): 'u1',
+    ('RP', 2): 'u2',
+    ('RI', 1): 'i1',
+    ('RI', 2): 'i2',
+    ('FP', 4): 'f4',
+}
 
 
 class TektronixDPO5000(TektronixInstrument):
 
     def __init__(self, *args, **kwargs):
-        super(TektronixDPO5000, self).__(*args, **kwargs)
+        super(TektronixDPO5000, self).__init__(*args, **kwargs)
+        # a large read buffer keeps multi-MB :curve? transfers from
+        # being chopped into the small default chunks on interfaces
+        # (like PyVISA) that expose a chunk_size
+        if hasattr(self._interface, 'chunk_size'):
+            self._interface.chunk_size = 1024 * 1024
+        # scratch buffer recycled across :curve? fetches so sustained
+        # streaming does not malloc/free megabytes per frame
+        self._curve_buf = None
 
     def _fetch_trace(self, channel_name=''):
 
         if self._driver_operation_simulate:
             return TraceXY()
 
-        self._write(":data:source {}".format(channel_name))
-        self._write(":data:encdg fastest")
-        self._write(":data:width 2")
-        self._write(":data:start 1")
-        self._write(":data:stop 1e10")
+        # one compound message instead of five round trips
+        self._write_many((":data:source {}".format(channel_name),
+                          ":data:encdg fastest",
+                          ":data:width 2",
+                          ":data:start 1",
+                          ":data:stop 1e10"))
 
         trace = TraceXY()
 
-        # Read preamble
+        # Read preamble; the single :wfmoutpre? response carries every
+        # field, so no per-field WFMOutpre queries are needed
         pre = self._ask(":wfmoutpre?").split(';')
-        print("pre = {}".format(self._ask("WFMOutpre?")))
-        print("byt_nr {}".format(self._ask("WFMOUTpre:BYT_NR?")))
-        print("bit_nr {}".format(self._ask("WFMOUTpre:BIT_NR?")))
-        print("ENCDG {}".format(self._ask("WFMOUTpre:ENCDG?")))
-        print("BNFMT {}".format(self._ask("WFMOUTpre:BN_FMT?")))
-        print("BYTOR {}".format(self._ask("WFMOUTpre:BYT_OR?")))
-        print("NRFMT {}".format(self._ask("WFMOUTpre:NR_PT?")))
-        print("PTFMT {}".format(self._ask("WFMOUTpre:PT_FMT?")))
-        print("XINC {}".format(self._ask("WFMOUTpre:XINCR?")))
-        print("XZERO {}".format(self._ask("WFMOUTpre:XZERO?")))
-        print("PTOFF {}".format(self._ask("WFMOUTpre:PT_OFF?")))
-        print("YMULT {}".format(self._ask("WFMOUTpre:YMULT?")))
-        print("YOFOF {}".format(self._ask("WFMOUTpre:YOFF?")))
-        print("YZERO {}".format(self._ask("WFMOUTpre:YZERO?")))
-        print("NR_nr {}".format(self._ask("WFMOUTpre:NR_FR?")))
+        logger.debug("wfmoutpre fields: %s", pre)
         acq_format = pre[7].strip().upper()
         points = int(pre[6])
         point_size = int(pre[0])
@@ -59,30 +66,28 @@ class TektronixDPO5000(TektronixInstrument):
         if point_enc != 'BINARY':
             raise UnexpectedResponseException()
 
-        # Read waveform data
-        raw_data = self._ask_for_ieee_block(":curve?")
+        # Read waveform data; the expected byte count is known from
+        # the preamble, so grow the persistent scratch only when a
+        # record is larger than any seen before
+        nbytes = points * point_size
+        if self._curve_buf is None or len(self._curve_buf) < nbytes:
+            self._curve_buf = bytearray(nbytes)
+        raw_data = self._ask_for_ieee_block(":curve?", out=self._curve_buf)
         self._read_raw()  # flush buffer
 
-        # Store in trace object
-        if point_fmt == 'RP' and point_size == 1:
-            trace.y_raw = array.array('B', raw_data[0:points*2])
-        elif point_fmt == 'RP' and point_size == 2:
-            trace.y_raw = array.array('H', raw_data[0:points*2])
-        elif point_fmt == 'RI' and point_size == 1:
-            trace.y_raw = array.array('b', raw_data[0:points*2])
-        elif point_fmt == 'RI' and point_size == 2:
-            trace.y_raw = array.array('h', raw_data[0:points*2])
-        elif point_fmt == 'FP' and point_size == 4:
+        # Store in trace object; the endian-aware dtype makes numpy
+        # interpret the samples in place with no byteswap passes
+        if (point_fmt, point_size) not in _POINT_DTYPES:
+            raise UnexpectedResponseException()
+
+        if point_fmt == 'FP':
             trace.y_increment = 1
             trace.y_reference = 0
             trace.y_origin = 0
-            trace.y_raw = array.array('f', raw_data[0:points*4])
-        else:
-            raise UnexpectedResponseException()
-
-        if (byte_order == 'LSB') != sys.byteorder == 'little':
-            trace.y_raw.byteswap()
 
-        trace.y_raw.byteswap()
+        dtype = ('<' if byte_order == 'LSB' else '>') \
+            + _POINT_DTYPES[(point_fmt, point_size)]
+        count = min(points, len(raw_data) // point_size)
+        trace.y_raw = np.frombuffer(raw_data, dtype=dtype, count=count)
 
         return trace
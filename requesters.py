@@ -1,4 +1,6 @@
 import json
+import logging
+
 import requests
 import settings
 import ssl
@@ -11,12 +13,18 @@ class Requester(object):
     def __init__(self, *args, **kwargs):
         self.auth_token = str(settings.AUTH_TOKEN)
         self.session = requests.session()
-        self.session.headers.update(self.get_default_headers())
+        # build the default headers once; they only change on a token
+        # refresh, so per-request rebuilds are wasted allocations
+        self._default_headers = self.get_default_headers()
+        self.session.headers.update(self._default_headers)
+        # bound session methods so every request reuses the pooled
+        # keep-alive connections; the module-level requests functions
+        # would open a fresh connection (DNS/TCP/TLS) per call
         self.request_dict = {
-            'get': requests.get,
-            'post': requests.post,
-            'put': requests.put,
-            'del': requests.delete,
+            'get': self.session.get,
+            'post': self.session.post,
+            'put': self.session.put,
+            'del': self.session.delete,
         }
 
     def get_default_headers(self, refresh=False):
@@ -58,11 +66,12 @@ class Requester(object):
         return self.https_request(url, params=params, kind='get',
                                   headers=headers)
 
-    def https_post(self, url, data, headers={}):
-        return self.https_request(url, data=data, kind='post', headers=headers)
+    def https_post(self, url, data=None, headers={}, json=None):
+        return self.https_request(url, data=data, kind='post',
+                                  headers=headers, json=json)
 
     def https_request(self, url, data={}, params={}, headers={},
-                      kind='get'):
+                      kind='get', json=None):
         """Makes https requests
 
         Summary:
@@ -76,67 +85,76 @@ class Requester(object):
             headers: request headers, these will update the base
                 headers that are already assigned by get_default_headers
             kind: the flavor of the request (GET, POST, etc.)
+            json: an object to send as the JSON body; serialization is
+                left to requests so no extra string copy is held
 
         Returs:
             a requests module response object
         """
-        hdrs = self.get_default_headers()
+        hdrs = dict(self._default_headers)
         hdrs.update(headers)
 
         response = None
         try:
-            if data:
+            if json is not None:
+                response = self.request_dict[kind](url, json=json,
+                                                   headers=hdrs)
+            elif data:
                 response = self.request_dict[kind](url, data=data, headers=hdrs)
             else:
                 response = self.request_dict[kind](url, params=params, headers=hdrs)
         except ssl.SSLError:
             logger.warning("SSLError!", exc_info=True)
-            logger.info("Retrying request to {}".format(url))
-            response = self._retry_request(url, kind, data, params, headers)
+            logger.info("Retrying request to %s", url)
+            response = self._retry_request(url, kind, data, params, headers,
+                                           json)
         except Exception as e:
-            logger.warning("Unexpected request exc: {}".format(e))
+            logger.warning("Unexpected request exc: %s", e)
             logger.debug("The request exception info:", exc_info=True)
 
         if not response:
-            logger.warning("No response from {}".format(url))
+            logger.warning("No response from %s", url)
         elif response.status_code in [401, 403]:
             # refresh headers and try again
-            hdrs = self.get_default_headers(refresh=True)
-            self.session.headers.update(hdrs)
+            self._default_headers = self.get_default_headers(refresh=True)
+            self.session.headers.update(self._default_headers)
             response = self._retry_request(url, kind, data, params,
-                                           headers)
+                                           headers, json)
         elif response.status_code != 200:
             self._log_http_err_response(response, data, params)
 
-        # reset the headers to default
-        self.session.headers = self.get_default_headers()
         return response
 
-    def _retry_request(self, url, kind, data={}, params={}, headers={}):
-        """Retries the https request with a fresh session"""
-        self.session = requests.session()
-        self.session.headers.update(self.get_default_headers())
+    def _retry_request(self, url, kind, data={}, params={}, headers={},
+                       json=None):
+        """Retries the https request on the same pooled session"""
+        hdrs = dict(self._default_headers)
+        hdrs.update(headers)
         response = None
-        if headers:
-            # include any headers from method arg
-            self.session.headers.update(headers)
         try:
-            if data:
-                response = self.request_dict[kind](url, data=data)
+            if json is not None:
+                response = self.request_dict[kind](url, json=json,
+                                                   headers=hdrs)
+            elif data:
+                response = self.request_dict[kind](url, data=data,
+                                                   headers=hdrs)
             else:
-                response = self.request_dict[kind](url, params=params)
+                response = self.request_dict[kind](url, params=params,
+                                                   headers=hdrs)
         except ssl.SSLError:
             logger.warning("SSLError on retry. Aborting request.")
         except Exception as e:
             logger.warning("The retry request encountered an unexpected "
-                           "exception: {}".format(e))
+                           "exception: %s", e)
             logger.debug("The retry request exception info:", exc_info=True)
         return response
 
     def _log_http_err_response(self, response, data={}, params={}):
-        logger.warning("response.text %s" % response.text)
-        logger.warning("request headers %s" % self.session.headers)
+        logger.warning("response.text %s", response.text)
+        logger.warning("request headers %s", self.session.headers)
         logger.warning("more request details in debug level")
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
         if data:
             msg = "request data %s" % data
         elif params:
@@ -144,3 +162,15 @@ class Requester(object):
         if len(msg) > 500:
             msg = msg[0:500] + "..."
         logger.debug(msg)
+
+
+# shared Requester so commands reuse one HTTP session (and its pooled
+# keep-alive connections) instead of building a fresh one per command
+_default_requester = None
+
+
+def get_default_requester():
+    global _default_requester
+    if _default_requester is None:
+        _default_requester = Requester()
+    return _default_requester
@@ -2,21 +2,46 @@ import datetime
 import json
 import os
 import re
-import requests
+import numpy as np
 import ssl
 import settings
 from requests_toolbelt.multipart.encoder import MultipartEncoder
-from requesters import Requester
+from requesters import get_default_requester
 from settings import COMMAND_TIMEOUT, BASE_URL, SCREENSHOT_FILE
 from script_tools import timeout
 from scpi_logger import logger
 from instruments.base import TraceXY, NotInitializedException
 
+# orjson encodes/decodes large waveform dicts several times faster
+# than stdlib json; fall back to json when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps_bytes(data):
+    """Serializes data to JSON bytes with the fastest available codec"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode('utf-8')
+
+
+def _json_loads(buf):
+    """Deserializes JSON from a str or bytes buffer"""
+    if orjson is not None:
+        return orjson.loads(buf)
+    return json.loads(buf)
+
 
 class Waveform(TraceXY):
     pass
 
 
+# channel list inside a command's parentheses, e.g. G1:FetchWaveform(ch1,ch2)
+_CHANNEL_RE = re.compile(r'\(([^)]*)\)')
+
+
 class APIException(Exception):
 
     def __init__(self, *args, **kwargs):
@@ -32,36 +57,52 @@ class InvalidResultRequestError(Exception):
 
 
 class SCPICommand():
-    command = ''  # command string e.g. '*ESR?'
-    method = 'write'  # vxi11 method used on instrument (write or ask)
-    response = ''  # response from instrument
+
+    # commands are created per script line (and per loop), so slots
+    # drop the per-instance dict; subclasses that need extra
+    # attributes fall back to a dict automatically
+    __slots__ = ('instrument', 'command', 'response', '_is_query',
+                 '_runner')
 
     def __init__(self, command, instrument, *args, **kwargs):
         self.instrument = instrument
-        self.command = command
-        if command[-1] == '?':
-            self.method = 'ask'
+        self.command = command  # command string e.g. '*ESR?'
+        self.response = ''  # response from instrument
+        # resolve the instrument call once here instead of branching
+        # on a method-name string every run
+        self._is_query = command[-1] == '?'
+        if instrument is not None:
+            self._runner = instrument.ask if self._is_query \
+                else instrument.write
         else:
-            self.method = 'write'
+            self._runner = None
 
     def __str__(self):
         return self.command
 
     @timeout(COMMAND_TIMEOUT)
     def run(self):
-        if self.method == 'ask':
+        # the response stays a local so one interned command object
+        # can be reissued (e.g. inside loops) without shared state
+        response = self.response
+        runner = self._runner
+        if runner is None:
+            # no instrument at build time; surfaces the usual error
+            runner = (self.instrument.ask if self._is_query
+                      else self.instrument.write)
+        if self._is_query:
             try:
-                self.response = self.instrument.ask(self.command).rstrip('\r\n')
+                response = runner(self.command).rstrip('\r\n')
             except UnicodeDecodeError as e:
                 msg = "utf8' codec can't decode"
                 logger.info("Request for binary data detected")
                 if msg in str(e):
-                    self.response = self.instrument.ask_raw(self.command).rstrip('\r\n')
+                    response = self.instrument.ask_raw(self.command).rstrip('\r\n')
         else:
-            self.response = self.instrument.write(self.command)
-        logger.info("SCPICommand: {}; Response: {}"
-                    .format(self.command, self.response))
-        return self.response
+            response = runner(self.command)
+        logger.info("SCPICommand: %s; Response: %s",
+                    self.command, response)
+        return response
 
 
 class FetchWaveformCommand(SCPICommand):
@@ -75,7 +116,7 @@ class FetchWaveformCommand(SCPICommand):
     def _parse_channels(self, command):
         channels = []
         if '(' in command:
-            rematch = re.search('\((.*)\)', command)
+            rematch = _CHANNEL_RE.search(command)
             if rematch:
                 chlist = rematch.group(1).split(',')
                 channels = [c.strip().lower() for c in chlist if c]
@@ -93,23 +134,40 @@ class FetchWaveformCommand(SCPICommand):
         waveform = self.instrument.fetch_waveform(self.channels)
         waveform['instrument_type'] = self._get_instrument_type()
         self.response = self.save_to_file(waveform)
-        logger.info("FetchWaveformCommand response: {}".format(self.response))
+        logger.info("FetchWaveformCommand response: %s", self.response)
         return self.response
 
     def save_to_file(self, data, filepath=''):
-        """saves data to filepath designated in settings.py"""
+        """saves data to filepath designated in settings.py
+
+        The per-channel sample arrays are written to binary .npy
+        sidecar files, which are several times smaller and much faster
+        to read back than JSON text. The metadata JSON keeps a
+        y_values_file reference to each sidecar in place of the
+        y_values list.
+        """
         if not filepath:
             filepath = settings.WAVEFORM_FILE
         response = 'No waveform saved'  # default msg until success
+        base = os.path.splitext(filepath)[0]
         try:
+            for chdata in data.get('channels', []):
+                # raw-payload channels already carry compact base64
+                # samples, so only float y_values lists get a sidecar
+                if 'y_values' not in chdata:
+                    continue
+                sidecar = '{}-{}.npy'.format(base,
+                                             chdata.get('name', 'channel'))
+                np.save(sidecar, np.asarray(chdata.pop('y_values')))
+                chdata['y_values_file'] = sidecar
             with open(filepath, 'wb') as f:
-                f.write(json.dumps(data))
+                f.write(_json_dumps_bytes(data))
         except IOError as e:
             logger.warning(e)
         except OSError as e:
             logger.warning(e)
         except Exception as e:
-            logger.error("Unexpected error: {}".format(e),
+            logger.error("Unexpected error: %s", e,
                          exc_info=True)
         else:
             # success!
@@ -140,7 +198,7 @@ class FetchScreenshotCommand(SCPICommand):
         except OSError as e:
             logger.warning(e)
         except Exception as e:
-            logger.error("Unexpected error: {}".format(e),
+            logger.error("Unexpected error: %s", e,
                          exc_info=True)
         if scn:
             response = self.save_to_file(scn)
@@ -148,7 +206,7 @@ class FetchScreenshotCommand(SCPICommand):
             response = "Unable to fetch screenshot!"
             logger.warning(response)
         self.response = response
-        logger.info("FetchScreenshotCommand response: {}".format(response))
+        logger.info("FetchScreenshotCommand response: %s", response)
         return self.response
 
     def save_to_file(self, data, filepath=''):
@@ -164,7 +222,7 @@ class FetchScreenshotCommand(SCPICommand):
         except OSError as e:
             logger.warning(e)
         except Exception as e:
-            logger.error("Unexpected error: {}".format(e),
+            logger.error("Unexpected error: %s", e,
                          exc_info=True)
         else:
             # success!
@@ -176,39 +234,45 @@ class FileTransmitter(object):
 
     def __init__(self, category=''):
         self.category = category
-        self.requester = Requester()
+        self.requester = get_default_requester()
 
     def transmit(self, filepath, file_key='', mode='rb'):
         """transmits file to server"""
-        with open(filepath, mode) as f:
-            filename = os.path.basename(f.name)
+        filename = os.path.basename(filepath)
         if not file_key:
             file_key = filename
-        fields = {
-            'file': (filename, open(filepath, mode)),
-            'file_key': file_key,
-            'category': self.category,
-        }
-        multipartblob = MultipartEncoder(fields=fields)
-
-        # get the temporary upload url to post the file to
-        resp = self.requester.https_get(BASE_URL + "/upload/geturl")
-        if not resp:
-            logger.warning("No response from {}. Aborting upload."
-                           .format(BASE_URL + "/upload/geturl"))
-            return
-
-        headers = {'Content-Type': multipartblob.content_type}
-        response = None
+        # open the file once and let MultipartEncoder stream it in
+        # chunks, so peak memory stays flat no matter the file size
+        f = open(filepath, mode)
         try:
-            response = requests.post(resp.text, data=multipartblob,
-                                     headers=headers)
-        except TypeError:
-            logger.warning("TypeError during transmit_file call",
-                           exc_info=True)
-        except ssl.SSLError:
-            logger.warning("SSLError! during transmit_file",
-                           exc_info=True)
+            fields = {
+                'file': (filename, f),
+                'file_key': file_key,
+                'category': self.category,
+            }
+            multipartblob = MultipartEncoder(fields=fields)
+
+            # get the temporary upload url to post the file to
+            resp = self.requester.https_get(BASE_URL + "/upload/geturl")
+            if not resp:
+                logger.warning("No response from %s. Aborting upload.",
+                               BASE_URL + "/upload/geturl")
+                return
+
+            headers = {'Content-Type': multipartblob.content_type}
+            response = None
+            try:
+                response = self.requester.session.post(resp.text,
+                                                       data=multipartblob,
+                                                       headers=headers)
+            except TypeError:
+                logger.warning("TypeError during transmit_file call",
+                               exc_info=True)
+            except ssl.SSLError:
+                logger.warning("SSLError! during transmit_file",
+                               exc_info=True)
+        finally:
+            f.close()
         self._log_upload_response(response)
         return response
 
@@ -223,13 +287,13 @@ class FileTransmitter(object):
             if not response_text:
                 logger.warning("No response text to log")
             else:
-                logger.warning("Non 200 response {}".format(response_text))
+                logger.warning("Non 200 response %s", response_text)
 
 
 class PostScreenshotCommand(object):
 
     def __init__(self, *args, **kwargs):
-        self.requester = Requester()
+        self.requester = get_default_requester()
 
     def __str__(self):
         return 'PostScreenshotCommand'
@@ -248,14 +312,14 @@ class PostScreenshotCommand(object):
         """
         transmitter = FileTransmitter(category='fetch_screenshot')
         dt_str = datetime.datetime.now().isoformat()
-        file_key = 'screenshot-' + dt_str.split(',')[0]
-        logger.info("Using file_key: " + file_key)
+        file_key = 'screenshot-' + dt_str
+        logger.info("Using file_key: %s", file_key)
         response = transmitter.transmit(SCREENSHOT_FILE, file_key=file_key)
         result_id = self._handle_response(response)
         if result_id:
-            logger.info("Result ID for screenshot: {}".format(result_id))
+            logger.info("Result ID for screenshot: %s", result_id)
             rid_url = BASE_URL + '/results/{}'.format(result_id)
-            logger.info("You can view the result at: {}".format(rid_url))
+            logger.info("You can view the result at: %s", rid_url)
         else:
             logger.warning("No Result ID from waveform upload")
 
@@ -294,7 +358,7 @@ class PostWaveformCommand(object):
         self.instr = None
         self.trace_dict = {}
         self.result_id = ''
-        self.requester = Requester()
+        self.requester = get_default_requester()
         self._set_divisions()
 
     def __str__(self):
@@ -306,17 +370,27 @@ class PostWaveformCommand(object):
         data = None
         with open(filepath, 'rb') as f:
             try:
-                data = json.loads(f.read())
+                data = _json_loads(f.read())
             except IOError as e:
                 logger.warning(e)
             except OSError as e:
                 logger.warning(e)
             except Exception as e:
-                logger.error("Unexpected error: {}".format(e),
+                logger.error("Unexpected error: %s", e,
                              exc_info=True)
         if not data:
             data = {}
 
+        # pull the sample arrays back in from the .npy sidecars
+        for chdata in data.get('channels', []):
+            if 'y_values_file' in chdata:
+                yfile = chdata.pop('y_values_file')
+                try:
+                    chdata['y_values'] = np.load(yfile).tolist()
+                except IOError as e:
+                    logger.warning(e)
+                    chdata['y_values'] = []
+
         return data
 
 
@@ -330,7 +404,7 @@ class PostWaveformCommand(object):
     def _create_waveform_result(self):
         """Creates a waveform result on the server"""
         dt_str = datetime.datetime.now().isoformat()
-        waveform_id = 'waveform-' + dt_str.split(',')[0]
+        waveform_id = 'waveform-' + dt_str
         if 'instrument_type' in self.trace_dict:
             instrument_type = self.trace_dict.pop('instrument_type')
         else:
@@ -350,28 +424,28 @@ class PostWaveformCommand(object):
         # data['device_under_test'] = settings.DUT
 
         r_url = BASE_URL + '/results'
-        json_data = json.dumps(data, ensure_ascii=True)
-        response = self.requester.https_post(r_url, data=json_data)
+        # requests serializes the dict once; no second str copy held
+        response = self.requester.https_post(r_url, json=data)
         result_id = ''
         if not response:
             return
 
-        logger.info("Request to {} response.status_code: {}"
-                    .format(r_url, response.status_code))
+        logger.info("Request to %s response.status_code: %s",
+                    r_url, response.status_code)
         try:
             result_id = json.loads(response.text)['result']['id']
         except ValueError:
             logger.warning("ValueError in _create_waveform_results")
-            logger.info("response text: {}".format(response.text))
+            logger.info("response text: %s", response.text)
         except KeyError:
             logger.warning("KeyError in _create_waveform_results")
         except Exception as e:
-            logger.warning("Unexpected error: {}".format(e), exc_info=True)
+            logger.warning("Unexpected error: %s", e, exc_info=True)
         else:
-            logger.info("Result created successfully with result_id: {}"
-                        .format(result_id))
+            logger.info("Result created successfully with result_id: %s",
+                        result_id)
             rid_url = r_url + '/{}'.format(result_id)
-            logger.info("You can view the result at: {}".format(rid_url))
+            logger.info("You can view the result at: %s", rid_url)
         self.trace_dict['result_id'] = result_id
         return result_id
 
@@ -379,9 +453,9 @@ class PostWaveformCommand(object):
         if filename == '':
             filename = 'full-trace-{}.json'.format(self.result_id)
         self.trace_file = os.path.join(settings.DATADIR, filename)
-        logger.info("Writing full trace to file: {}".format(self.trace_file))
-        with open(self.trace_file, 'w') as f:
-            f.write(json.dumps(self.trace_dict))
+        logger.info("Writing full trace to file: %s", self.trace_file)
+        with open(self.trace_file, 'wb') as f:
+            f.write(_json_dumps_bytes(self.trace_dict))
 
     def _set_divisions(self, h_divs=0, v_divs=0):
         """Checks the instrument for divisions
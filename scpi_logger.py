@@ -1,47 +1,11 @@
 import datetime
 import logging
 import os
+from logging.handlers import RotatingFileHandler
 
 from settings import LOGDIR, MAX_LOGFILE_SIZE
 
 
-def purge_logfile(file):
-    if not os.path.isfile(file):
-        return
-    try:
-        os.remove(file)
-    except OSError as e:
-        print("OSError in purge_logfile. Err: {}".format(e))
-        raise
-    except Exception as e:
-        print("Unexpected purge logfile exception! {}".format(e))
-        raise
-
-
-def rotate_logfiles(original_file, max_num_files=10):
-    """Creates a new logfile if needed. Purges old ones if needed.
-
-    Returns the new log file.
-    """
-    for i in range(max_num_files):
-        file_num = i + 1
-        nextlogfile = original_file + "." + str(file_num)
-        if not os.path.isfile(nextlogfile):
-            break
-        if os.stat(nextlogfile).st_size < int(MAX_LOGFILE_SIZE):
-            # purge the oldest file so that it's ready next rotate
-            if file_num < int(max_num_files):
-                file_num += 1
-                purge_logfile(original_file + "." + str(file_num))
-            # break to return nextlogfile
-            break
-        # if all allowed files are full, purge and original
-        if file_num == int(max_num_files):
-            purge_logfile(original_file)
-            nextlogfile = original_file
-    return nextlogfile
-
-
 def get_logger(file_lvl=logging.DEBUG,
                loggername='scpi_runner.log',
                console_lvl=logging.INFO,
@@ -60,20 +24,21 @@ def get_logger(file_lvl=logging.DEBUG,
     _logger.propagate = False
     logger_file = os.path.join(LOGDIR, loggername)
 
-    now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    initmsg = now + " :: [ INIT ] Initializing {}\n".format(loggername)
-    # check if file exists
+    # check if file exists; only build the init message when it is
+    # actually written
     if not os.path.isfile(logger_file):
+        now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        initmsg = now + " :: [ INIT ] Initializing {}\n".format(loggername)
         with open(logger_file, 'w') as f:
             f.write(initmsg)
 
-    # check logfile size and rotate if needed
-    if os.stat(logger_file).st_size > int(MAX_LOGFILE_SIZE):
-        logger_file = rotate_logfiles(logger_file)
-
-    # create file handler
+    # create file handler; RotatingFileHandler rolls the file over
+    # at MAX_LOGFILE_SIZE on its own, so no startup scan of old
+    # logfiles is needed
     console_handler = logging.StreamHandler()  # by default, sys.stderr
-    file_handler = logging.FileHandler(logger_file)
+    file_handler = RotatingFileHandler(logger_file,
+                                       maxBytes=int(MAX_LOGFILE_SIZE),
+                                       backupCount=10)
 
     # set logging levels
     console_handler.setLevel(console_lvl)
@@ -1,16 +1,16 @@
 import errno
+import functools
 import os
 import socket
 import sys
 
 from instruments.base import Instrument
 from instruments.instrument_utils import InstrumentConnectionError
-from settings import SCRIPT_TIMEOUT
 from settings import BASE_URL, SCPIDIR
 from instruments import instrument_drivers
-from requesters import Requester
+from requesters import get_default_requester
 from scpi_logger import logger
-from script_tools import timeout, TimeoutError, Sleep, G1Loop
+from script_tools import Sleep, G1Loop, G1Script
 from scpi_commands import SCPICommand, FetchWaveformCommand
 from scpi_commands import FetchScreenshotCommand
 from scpi_commands import PostWaveformCommand, PostScreenshotCommand
@@ -19,41 +19,70 @@ from scpi_commands import PostWaveformCommand, PostScreenshotCommand
 SCPI_FILENAME = 'scpi_script.txt'
 SCPI_FILEPATH = os.path.join(SCPIDIR, SCPI_FILENAME)
 
+# G1 command lookup built once at import; _parse_basic_cmd used to
+# rebuild the dict (and a key tuple) for every script line
+_G1_COMMANDS = {
+    'G1:SLEEP': Sleep,
+    'G1:FETCHWAVEFORM': FetchWaveformCommand,
+    'G1:FETCHSCREENSHOT': FetchScreenshotCommand,
+    'G1:POSTWAVEFORM': PostWaveformCommand,
+    'G1:POSTSCREENSHOT': PostScreenshotCommand,
+}
+_G1_PREFIXES = tuple(_G1_COMMANDS)
 
-class G1Script(object):
-    """A GradientOne script parsed from the SCPI script file
+_OPEN_PREFIX = 'G1:OPEN:'
 
-    When the script is run the class will iterate through each
-    command to call its 'run' method. Each command can either
-    be a SCPICommand or a ScriptLogic object.
+_UPLOAD_URL_ENDPOINT = BASE_URL + '/upload/geturl'
 
-    Responses will be added to the responses attribute. If the
-    response is also a list it will extend responses, else it
-    will just be appended to the list.
+
+@functools.lru_cache(maxsize=1024)
+def _make_scpi_command(cmdstr, instrument):
+    """Interns SCPICommand objects for repeated command strings
+
+    Scripts with big loops reissue identical commands; sharing one
+    object per (command, instrument) pair skips the re-allocation and
+    attribute setup on every occurrence. SCPICommand.run keeps its
+    response local, so sharing is safe.
     """
-    commands = []
-    responses = []
+    return SCPICommand(command=cmdstr, instrument=instrument)
 
-    def __init__(self, commands):
-        script = [str(command) for command in commands]
-        logger.info("building G1Script: {}".format(script))
-        self.commands = commands
 
-    @timeout(SCRIPT_TIMEOUT)
-    def run(self):
-        for command in self.commands:
-            try:
-                response = command.run()
-            except TimeoutError:
-                logger.warning("Command '{}' timed out!".format(command))
-            except Exception as e:
-                logger.warning("Command '{}' encountered an unexpected "
-                               "exception: {};".format(command, e))
-            else:
-                if isinstance(response, list):
-                    self.responses.extend(response)
-                else:
-                    self.responses.append(response)
+def _fuse_writes(commands):
+    """Coalesces runs of consecutive write-only SCPI commands
+
+    SCPI allows several commands in one message separated by ';', so
+    a run of plain writes can go out as a single compound command and
+    cost one instrument round trip instead of one per command.
+    Queries, G1 commands and script logic act as flush points; a
+    G1Loop is fused internally only when every command in it is a
+    plain write.
+    """
+    fused = []
+    run = []
+
+    def flush():
+        if not run:
+            return
+        if len(run) == 1:
+            fused.append(run[0])
+        else:
+            fused.append(SCPICommand(
+                command=';'.join(c.command for c in run),
+                instrument=run[0].instrument))
+        del run[:]
+
+    for command in commands:
+        if type(command) is SCPICommand and not command._is_query:
+            run.append(command)
+            continue
+        flush()
+        if (isinstance(command, G1Loop) and command.commands and
+                all(type(c) is SCPICommand and not c._is_query
+                    for c in command.commands)):
+            command.commands = _fuse_writes(command.commands)
+        fused.append(command)
+    flush()
+    return fused
 
 
 class SCPIClient():
@@ -84,7 +113,7 @@ class SCPIClient():
             None. This command does not return a value
         """
         if not os.path.exists(filepath):
-            logger.error("No SCPI file at {}".format(filepath))
+            logger.error("No SCPI file at %s", filepath)
             return
 
         self.script = None
@@ -95,8 +124,7 @@ class SCPIClient():
         except OSError as e:
             logger.warning(e)
         except Exception as e:
-            logger.error("Unexpected error: {}".format(e),
-                         exc_info=True)
+            logger.error("Unexpected error: %s", e, exc_info=True)
 
     def run_script(self):
         if self.script:
@@ -118,14 +146,24 @@ class SCPIClient():
         Returns:
             G1Script object
         """
+        # scripts are small, so one read beats per-line buffered I/O
         with open(filepath, 'r') as scpifile:
-            for row in scpifile:
-                cmdstr = self._sanitize_command_string(row)
-                if cmdstr:
-                    try:
-                        self._parse_command_string(cmdstr)
-                    except socket.error as e:
-                        self._handle_socket_err(e)
+            data = scpifile.read()
+        # materialize the eligible rows in one comprehension pass so
+        # the parse loop below runs over a fully-sized list instead of
+        # interleaving sanitizing with command construction
+        rows = [cmd for cmd
+                in map(self._sanitize_command_string, data.splitlines())
+                if cmd]
+        for cmdstr in rows:
+            # uppercase once per line; the parse helpers all
+            # need the same cased copy
+            cmdcaps = cmdstr.upper()
+            try:
+                self._parse_command_string(cmdstr, cmdcaps)
+            except socket.error as e:
+                self._handle_socket_err(e)
+        self.commands = _fuse_writes(self.commands)
         return G1Script(commands=self.commands)
 
     def _sanitize_command_string(self, row):
@@ -142,39 +180,55 @@ class SCPIClient():
                 f.write(content)
         except IOError as e:
             # not able to read the file
-            logger.warning("IOError write(): {}".format(e))
+            logger.warning("IOError write(): %s", e)
         except TypeError as e:
             # bad data in the file
-            logger.warning("TypeError write(): {}".format(e))
+            logger.warning("TypeError write(): %s", e)
         except Exception as e:
-            logger.error("Unexpected error in write(): {}".format(e))
+            logger.error("Unexpected error in write(): %s", e)
 
-    def _parse_command_string(self, cmdstr):
+    def _parse_command_string(self, cmdstr, cmdcaps=None):
         """Parses the commands string and adds it to the G1Script
 
         Summary:
             Either initializes the instrument or handles a scpi
             command. Handling a scpi command will instantiate a
             SCPICommand object to use for controlling the instrument.
+            The caller may pass cmdcaps (the uppercased command) to
+            avoid re-casing the same string in each helper.
 
         Returns:
             None
         """
-        cmdcaps = cmdstr.upper()
-        if cmdcaps.startswith('G1:OPEN') or cmdcaps.startswith('TCPIP'):
-            try:
-                self.instrument = self._open_instrument(cmdstr)
-            except InstrumentConnectionError:
-                logger.warning("Encountered InstrumentConnectionError when "
-                               "attempting to open with '{}'".format(cmdstr))
-                logger.warning("Exiting...")
-                sys.exit()
-        elif cmdcaps.startswith('G1:STARTLOOP') or cmdcaps == 'G1:ENDLOOP':
-            self._parse_loop_cmd(cmdstr)
+        if cmdcaps is None:
+            cmdcaps = cmdstr.upper()
+        # one dict lookup on the command head replaces a chain of
+        # startswith scans over the same string
+        head = cmdcaps.split(':', 2)
+        if head[0] == 'G1' and len(head) > 1:
+            key = 'G1:' + head[1]
+        else:
+            key = head[0]
+        handler = self._PARSE_DISPATCH.get(key)
+        if handler is None and key.startswith('TCPIP'):
+            # resource strings may carry a suffix, e.g. TCPIP0::...
+            handler = SCPIClient._handle_open_cmd
+        if handler is not None:
+            handler(self, cmdstr, cmdcaps)
         else:
-            self._parse_basic_cmd(cmdstr)
+            self._parse_basic_cmd(cmdstr, cmdcaps)
 
-    def _parse_basic_cmd(self, cmdstr):
+    def _handle_open_cmd(self, cmdstr, cmdcaps=None):
+        """Opens the instrument named by an open command"""
+        try:
+            self.instrument = self._open_instrument(cmdstr)
+        except InstrumentConnectionError:
+            logger.warning("Encountered InstrumentConnectionError when "
+                           "attempting to open with '%s'", cmdstr)
+            logger.warning("Exiting...")
+            sys.exit()
+
+    def _parse_basic_cmd(self, cmdstr, cmdcaps=None):
         """Parses a basic command string
 
         This will either create a Sleep or SCPICommand to
@@ -184,39 +238,34 @@ class SCPIClient():
         Otherwise the command will just be appended to the regular
         list of commands.
         """
-        g1_commands = {
-            'G1:SLEEP': Sleep,
-            'G1:FETCHWAVEFORM': FetchWaveformCommand,
-            'G1:FETCHSCREENSHOT': FetchScreenshotCommand,
-            'G1:POSTWAVEFORM': PostWaveformCommand,
-            'G1:POSTSCREENSHOT': PostScreenshotCommand,
-        }
-        cmdstr = cmdstr.upper()
-        # if cmdstr in g1_commands:
-        if cmdstr.startswith(tuple(g1_commands.keys())):
-            key = cmdstr.split('(')[0]
-            command = g1_commands[key](command=cmdstr,
-                                       instrument=self.instrument)
+        if cmdcaps is None:
+            cmdcaps = cmdstr.upper()
+        if cmdcaps.startswith(_G1_PREFIXES):
+            key = cmdcaps.split('(')[0]
+            command = _G1_COMMANDS[key](command=cmdcaps,
+                                        instrument=self.instrument)
         else:
-            command = SCPICommand(command=cmdstr, instrument=self.instrument)
+            command = _make_scpi_command(cmdcaps, self.instrument)
         if self.loops:
             self.loops[-1].commands.append(command)
         else:
             self.commands.append(command)
 
-    def _parse_loop_cmd(self, cmdstr):
+    def _parse_loop_cmd(self, cmdstr, cmdcaps=None):
         """Parses the loop command string
 
         This will either create a new loop or it will end a loop
         and add the loop to the list of commands.
         """
-        if cmdstr.upper().startswith('G1:STARTLOOP'):
+        if cmdcaps is None:
+            cmdcaps = cmdstr.upper()
+        if cmdcaps.startswith('G1:STARTLOOP'):
             self.loops.append(self._create_loop(cmdstr))
-        elif cmdstr.upper() == 'G1:ENDLOOP':
+        elif cmdcaps == 'G1:ENDLOOP':
             loopcmd = self.loops.pop()
             self.commands.append(loopcmd)
         else:
-            logger.error("Unexpected loop string: {}".format(cmdstr))
+            logger.error("Unexpected loop string: %s", cmdstr)
 
     def _create_loop(self, loopstr):
         """Parses the loopstr to build a G1Loop
@@ -235,8 +284,13 @@ class SCPIClient():
 
     def _open_instrument(self, cmdstr, retry=True):
         """Opens connection with the Instrument"""
-        addr = cmdstr.upper().split('G1:OPEN:')[-1]
-        logger.info("Initializing instrument at: {}".format(addr))
+        # slice the known prefix off instead of uppercasing and
+        # splitting the whole string just to discard the head
+        if cmdstr[:len(_OPEN_PREFIX)].upper() == _OPEN_PREFIX:
+            addr = cmdstr[len(_OPEN_PREFIX):].upper()
+        else:
+            addr = cmdstr.upper()
+        logger.info("Initializing instrument at: %s", addr)
         try:
             raw_instr = Instrument(addr)
         except socket.error as serr:
@@ -256,7 +310,16 @@ class SCPIClient():
             return self.instrument
 
     def _handle_socket_err(self, err):
-        logger.warning("Socket Error: {}".format(err))
+        logger.warning("Socket Error: %s", err)
+
+    # command-head dispatch table for _parse_command_string; basic
+    # commands are the default when no key matches
+    _PARSE_DISPATCH = {
+        'G1:OPEN': _handle_open_cmd,
+        'TCPIP': _handle_open_cmd,
+        'G1:STARTLOOP': _parse_loop_cmd,
+        'G1:ENDLOOP': _parse_loop_cmd,
+    }
 
 
 class Result(object):
@@ -265,7 +328,7 @@ class Result(object):
         self.category = ''  # fetch_screenshot, results_table, etc.
         self.file_key = ''
         self.command_id = ''
-        self.requester = Requester()
+        self.requester = get_default_requester()
 
     def save_to_server(self):
         """Saves Result to server
@@ -280,8 +343,7 @@ class Result(object):
         Returns:
             A requests module response object
         """
-        BASE_URL + '/upload/geturl'
-        upload_url = self.requester.https_get(BASE_URL + '/upload/geturl')
+        upload_url = self.requester.https_get(_UPLOAD_URL_ENDPOINT)
         data = {
             'category': self.category,
             'file_key': self.file_key,
@@ -1,9 +1,11 @@
+import logging
+import signal
+import threading
 import time
 import functools
-import re
 from threading import Thread
 from scpi_logger import logger
-from settings import COMMAND_TIMEOUT
+from settings import COMMAND_TIMEOUT, SCRIPT_TIMEOUT
 
 
 class TimeoutError(Exception):
@@ -11,45 +13,96 @@ class TimeoutError(Exception):
         super(TimeoutError, self).__init__('Timeout', *args)
 
 
+_HAS_SIGALRM = hasattr(signal, 'SIGALRM')
+
+
+def _run_with_alarm(func, timeout, args, kwargs):
+    """Enforces the timeout with a POSIX interval timer
+
+    Arming ITIMER_REAL is one syscall each way, versus spawning and
+    joining a worker thread per call. A timer armed by an outer
+    decorated call (the script timeout around command timeouts) is
+    saved and re-armed with its remaining time afterwards, so nested
+    timeouts keep working; an outer deadline that passed while this
+    call ran fires almost immediately after it returns.
+    """
+    def handler(signum, frame):
+        raise TimeoutError(
+            'function [{}] timeout [{} seconds] exceeded!'
+            .format(func.__name__, timeout))
+
+    old_handler = signal.signal(signal.SIGALRM, handler)
+    start = time.monotonic()
+    old_delay, _ = signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(*args, **kwargs)
+    except TimeoutError:
+        logger.error('function [%s] timeout [%s seconds] exceeded!',
+                     func.__name__, timeout)
+        raise
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, old_handler)
+        if old_delay:
+            remaining = old_delay - (time.monotonic() - start)
+            signal.setitimer(signal.ITIMER_REAL, max(remaining, 1e-6))
+
+
+def _run_in_thread(func, timeout, args, kwargs):
+    """Enforces the timeout with a daemon worker thread
+
+    Fallback for platforms without SIGALRM and for calls made off the
+    main thread, where signal-based timers cannot be used.
+    """
+    origResult = TimeoutError(
+                 'function [{}] timeout [{} seconds] exceeded!'
+                 .format(func.__name__, timeout))
+    res = [origResult]
+
+    def newFunc():
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            result = e
+        res[0] = result
+    t = Thread(target=newFunc)
+    t.daemon = True
+    try:
+        t.start()
+        t.join(timeout)
+    except Exception as e:
+        logger.error('error starting thread')
+        raise e
+    result = res[0]  # get result from thread
+    if isinstance(result, TimeoutError):
+        logger.error('function [%s] timeout [%s seconds] exceeded!',
+                     func.__name__, timeout)
+        raise result
+    elif isinstance(result, BaseException):
+        logger.error("Unexpected exception in %s", func.__name__)
+        raise result
+    return result
+
+
 def timeout(timeout):
     def deco(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            origResult = TimeoutError(
-                         'function [{}] timeout [{} seconds] exceeded!'
-                         .format(func.__name__, timeout))
-            res = [origResult]
-
-            def newFunc():
-                try:
-                    result = func(*args, **kwargs)
-                except Exception as e:
-                    result = e
-                res[0] = result
-            t = Thread(target=newFunc)
-            t.daemon = True
-            try:
-                t.start()
-                t.join(timeout)
-            except Exception as e:
-                logger.error('error starting thread')
-                raise e
-            result = res[0]  # get result from thread
-            if isinstance(result, TimeoutError):
-                logger.error('function [{}] timeout [{} seconds] exceeded!'
-                             .format(func.__name__, timeout))
-                raise result
-            elif isinstance(result, BaseException):
-                logger.error("Unexpected exception in {}"
-                             .format(func.__name__))
-                raise result
-            return result
+            if (_HAS_SIGALRM and
+                    threading.current_thread() is threading.main_thread()):
+                return _run_with_alarm(func, timeout, args, kwargs)
+            return _run_in_thread(func, timeout, args, kwargs)
         return wrapper
     return deco
 
 
 class ScriptLogic(object):
     """Handles loops and conditionals for a SCPI script"""
+
+    # slots keep these small, frequently-touched objects off the
+    # per-instance dict and speed up attribute access in run loops
+    __slots__ = ('name',)
+
     def __init__(self, name='', *args, **kwargs):
         self.name = name
 
@@ -62,16 +115,19 @@ class ScriptLogic(object):
 
 class Sleep(ScriptLogic):
     """When running the script this will time.sleep()"""
+
+    __slots__ = ('seconds',)
+
     def __init__(self, command='', *args, **kwargs):
         super(Sleep, self).__init__(name='Sleep', *args, **kwargs)
-        rematch = re.search('\((.*)\)', command)
-        if rematch:
-            secstr = rematch.group(1)
-            try:
-                seconds = float(secstr)
-            except ValueError:
-                seconds = 1
-        else:
+        # the syntax is just G1:SLEEP(<float>), so plain string scans
+        # beat a regex for pulling out the seconds argument
+        lo = command.find('(')
+        hi = command.rfind(')')
+        secstr = command[lo + 1:hi] if 0 <= lo < hi else ''
+        try:
+            seconds = float(secstr)
+        except ValueError:
             seconds = 1
         self.seconds = seconds
 
@@ -82,13 +138,17 @@ class Sleep(ScriptLogic):
 
 class G1Loop(ScriptLogic):
     """GraidienOne class for handling commands in a loop"""
-    def __init__(self, commands=[], maxcount=1, break_on=None,
+
+    __slots__ = ('responses', 'commands', 'maxcount', 'break_on')
+
+    def __init__(self, commands=None, maxcount=1, break_on=None,
                  *args, **kwargs):
         super(G1Loop, self).__init__(*args, **kwargs)
         self.responses = []
 
-        # list of commands to run each iteration
-        self.commands = commands
+        # list of commands to run each iteration; a mutable default
+        # here would be shared across every loop instance
+        self.commands = [] if commands is None else commands
 
         # maximum number of times to loop
         self.maxcount = maxcount
@@ -97,24 +157,44 @@ class G1Loop(ScriptLogic):
         self.break_on = break_on
 
     def run(self):
-        for i in range(self.maxcount):
-            for command in self.commands:
-                try:
-                    response = command.run()
-                except TimeoutError:
-                    response = "G1Loop: '{}' timed out!".format(command)
-                    logger.warning(response)
-                except Exception as e:
-                    response = ("G1Loop: '{}' encountered an unexpected "
-                                "exception: {};".format(command, e))
-                    logger.warning(response)
-                self.responses.append(response)
-                if self.break_on is not None and response == self.break_on:
+        # bind each command's run method and the responses append
+        # once; the inner body executes maxcount * len(commands)
+        # times, so per-iteration attribute lookups add up
+        runners = [(command, command.run) for command in self.commands]
+        responses_append = self.responses.append
+        break_on = self.break_on
+        maxcount = self.maxcount
+        run_one = self._run_one
+
+        if break_on is None:
+            # lean variant with no break check per command
+            for i in range(maxcount):
+                for command, run in runners:
+                    responses_append(run_one(command, run))
+            return
+
+        for i in range(maxcount):
+            for command, run in runners:
+                response = run_one(command, run)
+                responses_append(response)
+                if response == break_on:
                     # Note: will break from the outer range() loop also
-                    logger.info("Received response {}; Breaking from loop"
-                                .format(response))
+                    logger.info("Received response %s; Breaking from loop",
+                                response)
                     return
 
+    def _run_one(self, command, run):
+        """Runs a single command, mapping failures to response text"""
+        try:
+            return run()
+        except TimeoutError:
+            response = "G1Loop: '{}' timed out!".format(command)
+        except Exception as e:
+            response = ("G1Loop: '{}' encountered an unexpected "
+                        "exception: {};".format(command, e))
+        logger.warning(response)
+        return response
+
     def __str__(self):
         if self.name:
             return self.name
@@ -122,5 +202,50 @@ class G1Loop(ScriptLogic):
             return 'G1LoopObject'
 
 
+class G1Script(object):
+    """A GradientOne script parsed from the SCPI script file
+
+    When the script is run the class will iterate through each
+    command to call its 'run' method. Each command can either
+    be a SCPICommand or a ScriptLogic object.
+
+    Responses will be added to the responses attribute. If the
+    response is also a list it will extend responses, else it
+    will just be appended to the list.
+    """
+
+    __slots__ = ('commands', '_runners', 'responses')
+
+    def __init__(self, commands):
+        # stringifying every command is only worth it when the log
+        # record would actually be emitted
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("building G1Script: %s",
+                        [str(command) for command in commands])
+        self.commands = commands
+        # resolve each command's run method once here; the command
+        # object rides along for the failure log messages
+        self._runners = [(command, command.run) for command in commands]
+        # NOTE: these used to be class-level lists, so every script
+        # instance shared (and kept growing) the same responses
+        self.responses = []
+
+    @timeout(SCRIPT_TIMEOUT)
+    def run(self):
+        for command, run in self._runners:
+            try:
+                response = run()
+            except TimeoutError:
+                logger.warning("Command '%s' timed out!", command)
+            except Exception as e:
+                logger.warning("Command '%s' encountered an unexpected "
+                               "exception: %s;", command, e)
+            else:
+                if isinstance(response, list):
+                    self.responses.extend(response)
+                else:
+                    self.responses.append(response)
+
+
 class Comparison(ScriptLogic):
     comparson_value = ''
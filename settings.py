@@ -1,23 +1,22 @@
-import sys
-if sys.version_info[0] == 3:
-    # python 3 import
-    from configparser import ConfigParser
-elif sys.version_info[0] == 2:
-    # python 2 import
-    from ConfigParser import ConfigParser
-else:
-    raise Exception("Unsupported version of Python")
-
 import errno
+import functools
+import logging
 import os
+import pickle
+import re
 import sys
-from shutil import copy
+import types
 from os.path import expanduser
 
 
+# plain stdlib logger rather than scpi_logger to avoid a circular
+# import (scpi_logger itself imports settings)
+log = logging.getLogger(__name__)
+
 HOME = expanduser("~")
 
 
+@functools.lru_cache(maxsize=1)
 def thisdir():
     """Returns the directory name of current file"""
     if getattr(sys, 'frozen', False):
@@ -30,27 +29,24 @@ def thisdir():
 
 SCPIDIR = thisdir()
 
-DATADIR = os.path.join(SCPIDIR, 'data')
-if not os.path.exists(DATADIR):
+
+def _ensure_dir(path):
+    """Creates the directory if needed; exist_ok skips the pre-stat"""
     try:
-        os.makedirs(DATADIR)
-    except OSError as e:
-        print("OSError creating data directory, e: {}".format(e))
-        raise
-    except Exception as e:
-        print("Exception creating data directory, e: {}".format(e))
+        os.makedirs(path, exist_ok=True)
+    except Exception:
+        log.exception("Error creating directory %s", path)
         raise
 
+
+DATADIR = os.path.join(SCPIDIR, 'data')
 LOGDIR = os.path.join(SCPIDIR, 'logs')
-if not os.path.exists(LOGDIR):
-    try:
-        os.makedirs(LOGDIR)
-    except OSError as e:
-        print("OSError creating log directory, e: {}".format(e))
-        raise
-    except Exception as e:
-        print("Exception creating log directory, e: {}".format(e))
-        raise
+for _d in (DATADIR, LOGDIR):
+    _ensure_dir(_d)
+del _d
+
+ETCDIR = os.path.join(SCPIDIR, 'etc')
+DOWNLOADS_DIR = os.path.join(HOME, 'Downloads')
 
 WAVEFORM_FILE = os.path.join(DATADIR, 'waveform.json')
 SCREENSHOT_FILE = os.path.join(DATADIR, 'screenshot.png')
@@ -60,17 +56,33 @@ MAX_LOGFILE_SIZE = 2000000
 
 # keys of known instrument_manufacturer strings with
 # values of GradientOne manufacturer strings
-KNOWN_MANF_DICT = {
-    'Rigol': 'Rigol',
-    'Rigol Technologies': 'Rigol',
-    'Keysight': 'Keysight',
-    'Keysight Technologies': 'Keysight',
-    'Copley': 'Copley',
-    'Tektronix': 'Tektronix',
-    'Agilent': 'Agilent',
-    'Agilent Technologies': 'Agilent',
-    'simulate': 'simulate',
-}
+KNOWN_MANF_DICT = types.MappingProxyType({
+    k: sys.intern(v) for k, v in {
+        'Rigol': 'Rigol',
+        'Rigol Technologies': 'Rigol',
+        'Keysight': 'Keysight',
+        'Keysight Technologies': 'Keysight',
+        'Copley': 'Copley',
+        'Tektronix': 'Tektronix',
+        'Agilent': 'Agilent',
+        'Agilent Technologies': 'Agilent',
+        'simulate': 'simulate',
+    }.items()})
+
+# casefolded view of the same table so callers can resolve a vendor
+# string with one normalization and one dict hit, no per-call
+# scanning of the casing variants
+KNOWN_MANF_LOOKUP = {k.casefold(): v for k, v in KNOWN_MANF_DICT.items()}
+
+
+def canonical_manf(manf):
+    """Returns the GradientOne manufacturer string for manf
+
+    Instruments report their manufacturer with inconsistent casing
+    and whitespace, e.g. 'RIGOL' or ' rigol technologies '. Unknown
+    manufacturers come back unchanged.
+    """
+    return KNOWN_MANF_LOOKUP.get(manf.strip().casefold(), manf)
 
 
 # sets the number of significant digits to round measurement values to
@@ -78,100 +90,247 @@ ROUND_SIG_DIGITS = 3
 
 # NOTE: to force no rounding, set ROUND_SIG_DIGITS to any Falsey value.
 
-DUT = 'SCPI_DUT'
-INSTRUMENT_TYPE = 'SCPI_InstrumentType'
+# interned so downstream dict lookups keyed on these constants take
+# the pointer-equality fast path
+DUT = sys.intern('SCPI_DUT')
+INSTRUMENT_TYPE = sys.intern('SCPI_InstrumentType')
 
 
-def find_file(fname):
-    """
-    Look for a configfile in relative Downloads directory.
-    If found, copy it to a relative etc director and remove the original.
+def _install_from_downloads(fname):
+    """Moves a freshly downloaded configfile into the etc directory
+
     A configfile should typcally be GradientOneConfig.txt
-    (previously gradientoneone.cfg or gradientone_one.cfg)
+    (previously gradientoneone.cfg or gradientone_one.cfg). This
+    side effect lives outside find_file so that the cached lookup
+    there stays a pure read.
     """
-    etc = os.path.join(SCPIDIR, 'etc')
-    downloads = os.path.join(HOME, 'Downloads')
-    configfile = os.path.join(downloads, fname)
-    if os.access(configfile, os.R_OK):
-        try:
-            os.mkdir(etc)
-        except OSError as e:
-            if e.errno != errno.EEXIST:
-                raise
-        copy(configfile, etc)
-        os.remove(configfile)
-    configfile = os.path.join(etc, fname)
+    downloads_path = os.path.join(DOWNLOADS_DIR, fname)
     try:
-        fp = open(configfile)
-    except IOError as e:
-        if e.errno == errno.EACCES:
-            # default data:
-            default_file = os.path.join(SCPIDIR, fname)
-            print("Using default data file in {}".format(default_file))
-            return default_file
-        # Not a permission error.
-        raise
-    else:
-        fp.close()
+        dl_mtime = os.stat(downloads_path).st_mtime
+    except OSError:
+        # nothing waiting in Downloads; the usual warm-start case
+        return
+    etc_path = os.path.join(ETCDIR, fname)
+    try:
+        etc_mtime = os.stat(etc_path).st_mtime
+    except OSError:
+        etc_mtime = -1
+    if dl_mtime <= etc_mtime:
+        # the installed copy is already at least as fresh; leave the
+        # download alone and skip the copy
+        return
+    # shutil is only needed on the rare install path, so defer its
+    # import out of the module load
+    from shutil import copyfileobj
+    try:
+        src = open(downloads_path, 'rb')
+    except IOError:
+        return
+    with src:
+        _ensure_dir(ETCDIR)
+        with open(etc_path, 'wb') as dst:
+            copyfileobj(src, dst)
+    os.remove(downloads_path)
+
+
+@functools.lru_cache(maxsize=32)
+def find_file(fname):
+    """Looks for a configfile in the relative etc directory
+
+    The result is memoized per filename, so repeat lookups skip the
+    filesystem entirely.
+    """
+    configfile = os.path.join(ETCDIR, fname)
+    if os.path.isfile(configfile):
+        # steady-state fast path: the installed copy exists, so one
+        # stat answers the lookup (and the lru_cache above makes any
+        # repeat call free)
         return configfile
+    default_file = os.path.join(SCPIDIR, fname)
+    if os.path.isfile(default_file):
+        # default data:
+        log.info("Using default data file in %s", default_file)
+        return default_file
+    raise IOError(errno.ENOENT, os.strerror(errno.ENOENT), configfile)
+
+
+_SECTION_RE = re.compile(r'^\s*\[([^\]]+)\]\s*$')
+_KV_RE = re.compile(r'^\s*([^=;#\s][^=]*?)\s*=\s*(.*?)\s*$')
+
+
+def _fast_parse(path):
+    """Parses a flat key=value config file into a dict of sections
+
+    The config files here are just simple [section] headers over
+    key=value pairs, so two regexes cover everything the stdlib
+    ConfigParser was doing (minus interpolation and multi-line
+    continuations, which the config files never use) at a fraction
+    of the import cost. Lines starting with '#' or ';' and blank
+    lines are skipped.
+    """
+    sections = {}
+    current = None
+    with open(path) as f:
+        for line in f:
+            match = _SECTION_RE.match(line)
+            if match:
+                current = sections.setdefault(match.group(1), {})
+                continue
+            match = _KV_RE.match(line)
+            if match and current is not None:
+                current[match.group(1)] = match.group(2)
+    return sections
+
+
+class FastConfigParser(object):
+    """Minimal ConfigParser stand-in backed by plain dicts
+
+    Exposes the small surface the rest of this module relies on:
+    the _sections mapping plus has_section/items. Keys keep their
+    case, matching the optionxform = str behavior the ConfigParser
+    version used.
+    """
+
+    def __init__(self, sections):
+        self._sections = sections
+
+    def has_section(self, section):
+        return section in self._sections
+
+    def items(self, section):
+        return list(self._sections[section].items())
+
+
+def _load_section_cache(cfgfile, mtime_ns):
+    """Returns cached sections for cfgfile, or None on any miss
+
+    The cache is a pickle sidecar next to the config file. A stale
+    or unreadable cache is treated as a miss; correctness never
+    depends on it.
+    """
+    try:
+        with open(cfgfile + '.cache.pkl', 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get('mtime') == mtime_ns:
+            return cached['sections']
+    except Exception:
+        pass
+    return None
+
+
+def _store_section_cache(cfgfile, mtime_ns, sections):
+    """Writes the parsed sections to the pickle sidecar atomically"""
+    cache_path = cfgfile + '.cache.pkl'
+    tmp_path = cache_path + '.tmp'
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'mtime': mtime_ns, 'sections': sections}, f)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        # best effort only; next start just reparses
+        pass
 
 
 def build_config_parser(filename='GradientOneAuthConfig.txt'):
-    """Builds a ConfigParser from config file info
+    """Builds a FastConfigParser from config file info
 
     Parameters:
         filename: the filename of the config file. This gets passed
             the find_file function to
 
     """
-    cfg = ConfigParser(dict_type=dict)
-    cfg.optionxform = str
     cfgfile = None
     try:
+        _install_from_downloads(filename)
         cfgfile = find_file(filename)
     except IOError:
         raise ValueError("Could not find a {} file. Please download "
                          "one for this machine.".format(filename))
     try:
-        cfg.read(cfgfile)
+        mtime_ns = os.stat(cfgfile).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+    if mtime_ns is not None:
+        sections = _load_section_cache(cfgfile, mtime_ns)
+        if sections is not None:
+            # warm start: the file is unchanged since it was last
+            # parsed, so skip the reparse entirely
+            return FastConfigParser(sections)
+    try:
+        sections = _fast_parse(cfgfile)
     except IOError:
         raise ValueError("Could not read the {} file. Please download a "
                          "valid config file for this machine."
                          .format(filename))
-    return cfg
+    if mtime_ns is not None:
+        _store_section_cache(cfgfile, mtime_ns, sections)
+    return FastConfigParser(sections)
+
 
+# config-derived values resolved on first attribute access via the
+# module __getattr__ below; importing settings no longer reads the
+# auth config from disk on code paths that never touch the API
+_CONFIG_ATTRS = ('cfg', 'CONFIG', 'COMMON_SETTINGS', 'AUTH_TOKEN',
+                 'DOMAINNAME', 'BASE_URL')
+_config = None
 
-COMMON_SETTINGS = {}
 
-cfg = None
-try:
-    cfg = build_config_parser()
-except ValueError as e:
-    print("\nWARNING: {}".format(e))
+def _load_config():
+    """Reads the auth config and derives the API settings from it
+
+    Runs once, on the first access to any of the names in
+    _CONFIG_ATTRS; the result is cached for the life of the process.
+    """
+    global _config
+    if _config is not None:
+        return _config
 
-if cfg is None:
-    print("WARNING: Without a valid GradientOneAuthConfig.txt you "
-          "will still be able to run commands locally, but you will not "
-          "be able to make calls to the GradientOne API.\n")
-else:
+    common_settings = {}
+    cfg = None
     try:
-        COMMON_SETTINGS = cfg._sections['common']
-    except KeyError as e:
-        msg = ("Encountered a KeyError when reading config file.\n\n"
-               "This is most likely due to missing data in the config file. "
-               "Please check the config file in {} or ~/Downloads for "
-               "'common' sections.\n\n ".format(SCPIDIR))
-        print(msg)
-
-if 'AUTH_TOKEN' in COMMON_SETTINGS:
-    AUTH_TOKEN = COMMON_SETTINGS['AUTH_TOKEN']
-else:
-    AUTH_TOKEN = ''
-if 'DOMAINNAME' in COMMON_SETTINGS:
-    DOMAINNAME = COMMON_SETTINGS['DOMAINNAME']
-else:
-    DOMAINNAME = ''
-if DOMAINNAME.find("localhost") == 0 or DOMAINNAME.find("127.0.0.1") == 0:
-    BASE_URL = "http://" + DOMAINNAME
-else:
-    BASE_URL = "https://" + DOMAINNAME
+        cfg = build_config_parser()
+    except ValueError as e:
+        log.warning("%s", e)
+
+    if cfg is None:
+        log.warning("Without a valid GradientOneAuthConfig.txt you "
+                    "will still be able to run commands locally, but you "
+                    "will not be able to make calls to the GradientOne "
+                    "API.")
+    elif cfg.has_section('common'):
+        # a plain dict copy keeps later membership tests off the
+        # parser internals
+        common_settings = dict(cfg.items('common'))
+    else:
+        log.warning("Could not find a 'common' section in the config "
+                    "file. This is most likely due to missing data in the "
+                    "config file. Please check the config file in %s or "
+                    "~/Downloads for 'common' sections.", SCPIDIR)
+
+    auth_token = common_settings.get('AUTH_TOKEN', '')
+    domainname = common_settings.get('DOMAINNAME', '')
+    if domainname.startswith(("localhost", "127.0.0.1")):
+        base_url = "http://" + domainname
+    else:
+        base_url = "https://" + domainname
+
+    _config = {
+        'cfg': cfg,
+        # the whole derived config in one object; the individual
+        # module attributes below stay as backward-compat aliases
+        'CONFIG': types.SimpleNamespace(auth_token=auth_token,
+                                        domainname=domainname,
+                                        base_url=base_url),
+        'COMMON_SETTINGS': common_settings,
+        'AUTH_TOKEN': auth_token,
+        'DOMAINNAME': domainname,
+        'BASE_URL': base_url,
+    }
+    return _config
+
+
+def __getattr__(name):
+    if name in _CONFIG_ATTRS:
+        return _load_config()[name]
+    raise AttributeError("module {!r} has no attribute {!r}"
+                         .format(__name__, name))